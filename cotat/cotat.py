@@ -1,18 +1,35 @@
 # general imports
+import os
+import hashlib
+import tempfile
+import zipfile
 import pkgutil
 import networkx as nx
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 import datetime
+from itertools import combinations
+from functools import lru_cache
+from string import Formatter
 from typing import List
+from scipy.optimize import minimize
+
+# optional imports
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
 
 # bokeh imports
 from bokeh.plotting import figure, output_file, save
-from bokeh.layouts import row, gridplot
-from bokeh.plotting import from_networkx
+from bokeh.layouts import row, column, gridplot
 from bokeh.models import (HoverTool, ColumnDataSource, LabelSet, TextInput,
                           Div, Button, CustomJS, Circle, MultiLine, TabPanel,
-                          Tabs)
+                          Tabs, GraphRenderer, CustomJSTransform, Spacer,
+                          StaticLayoutProvider)
+from bokeh.transform import transform
 
 # =============================
 # CONSTANTS
@@ -20,7 +37,6 @@ from bokeh.models import (HoverTool, ColumnDataSource, LabelSet, TextInput,
 
 GRAPH_PLOT_HEIGHT = 700
 GRAPH_PLOT_WIDTH = 1500
-INSTRUCTIONS_PLOT_HEIGHT = 50
 INSTRUCTIONS_PLOT_WIDTH = 1500
 
 POSITIVE_COLOR = "#DC0000"
@@ -43,16 +59,50 @@ EDGE_LINE_WIDTH = 3
 LABEL_OFFSET = 3
 LABEL_TEXT_SIZE = "12px"
 
-BUTTON_JS = pkgutil.get_data(__name__, "resources/button.js") \
-                   .decode().format(**globals())
-SEARCH_JS = pkgutil.get_data(__name__, "resources/search.js") \
-                   .decode().format(**globals())
-INSTRUCTIONS_HTML = pkgutil.get_data(__name__, "resources/instructions.html") \
-                           .decode().format(**globals())
+NUMBA_LAYOUT_MIN_NODES = 500
+NUMBA_DATES_MIN_NODES = 5000
+FR_REPULSION_BLOCK = 1024
+_NAT = np.iinfo(np.int64).min  # NaT as int64 nanoseconds
+
+CONTACT_GRAPH_CACHE_SIZE = 4
+_CONTACT_GRAPHS = {}  # _contact_graph cache, least recently used first
 
 # =============================
 
 
+def _jit(**options):
+    """Return numba.njit(**options), or the identity if numba is missing."""
+    if njit is None:
+        return lambda f: f
+    return njit(**options)
+
+
+@lru_cache(maxsize=None)
+def _resource(name: str) -> str:
+    """Return the named resource with its {CONSTANT} fields substituted.
+
+    Only the constants the template references are looked up, and each
+    resource is read and formatted once, on first use.
+    """
+    template = pkgutil.get_data(__name__, f"resources/{name}").decode()
+    fields = {field for _, field, _, _ in Formatter().parse(template) if field}
+    return template.format(**{field: globals()[field] for field in fields})
+
+
+def _positions(index: pd.Index, labels) -> np.ndarray:
+    """Return the integer positions of [labels] in [index].
+
+    Raises:
+        KeyError: If any of the labels is not in the index.
+    """
+    positions = index.get_indexer(labels)
+    missing = positions == -1
+    if missing.any():
+        raise KeyError(f"{pd.unique(np.asarray(labels)[missing]).tolist()} "
+                       "not in index")
+    return positions
+
+
 def _prune(nodes_df: pd.DataFrame, edges_df: pd.DataFrame,
            start: datetime.date, end: datetime.date) -> List[pd.DataFrame]:
     """Return only the nodes and edges relevant to the given time range.
@@ -68,36 +118,87 @@ def _prune(nodes_df: pd.DataFrame, edges_df: pd.DataFrame,
     Returns:
         List[pd.DataFrame]: The pruned dataframes of nodes and edges.
     """
-    infected_df = nodes_df[~nodes_df.date.isna()]
-    infected_in_range = list(infected_df[(start <= infected_df.date)
-                                         & (infected_df.date <= end)].index)
+    # missing dates become NaT, which compares False on both bounds
+    dates = pd.to_datetime(nodes_df.date)
+    in_range = (pd.Timestamp(start) <= dates) & (dates <= pd.Timestamp(end))
+    infected_in_range = nodes_df.index[in_range.values].tolist()
 
+    # nodes grows as contacts are added; the set mirrors it for O(1) lookups
     nodes = infected_in_range
+    in_nodes = set(nodes)
     edges = []
-    for i,j in edges_df.apply(lambda x: (x.source, x.target), axis=1):
-        if i in infected_in_range and j not in nodes:
+    for i,j in zip(edges_df.source.values, edges_df.target.values):
+        if i in in_nodes and j not in in_nodes:
             nodes.append(j)
+            in_nodes.add(j)
             edges.append((i,j))
-        elif j in infected_in_range and i not in nodes:
+        elif j in in_nodes and i not in in_nodes:
             nodes.append(i)
+            in_nodes.add(i)
             edges.append((i,j))
 
-    pruned_nodes_df = nodes_df.loc[nodes]
+    pruned_nodes_df = nodes_df.take(_positions(nodes_df.index, nodes))
     pruned_edges_df = pd.DataFrame([{"source":i, "target":j} for i,j in edges])
 
     return pruned_nodes_df, pruned_edges_df
 
 
+def _frame_key(*frames: pd.DataFrame) -> str:
+    """Return a hash of the columns, dtypes, index, and values of frames."""
+    h = hashlib.blake2b(digest_size=16)
+    for df in frames:
+        h.update(repr((list(df.columns), df.dtypes.astype(str).tolist()))
+                 .encode())
+        h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
+
 def _contact_graph(nodes: pd.DataFrame, edges: pd.DataFrame,
-                   membership_cols: List[str] = []) -> nx.Graph:
+                   membership_cols: List[str] = [],
+                   cache: bool = False) -> nx.Graph:
+    """Return the contact graph, optionally cached by the content of the data.
+
+    With [cache], repeated calls with equal data (e.g. restyling a
+    visualization in a notebook) reuse the graph instead of rebuilding it.
+    Cached graphs are frozen so that no caller can modify the cached copy,
+    and stay alive until evicted or cleared; see clear_graph_cache and
+    _build_contact_graph.
+    """
+    if not cache:
+        return _build_contact_graph(nodes, edges, membership_cols)
+    try:
+        key = (_frame_key(nodes, edges), tuple(membership_cols))
+    except TypeError:  # unhashable values (e.g. lists) in the data
+        return nx.freeze(_build_contact_graph(nodes, edges, membership_cols))
+    if key in _CONTACT_GRAPHS:
+        _CONTACT_GRAPHS[key] = _CONTACT_GRAPHS.pop(key)  # most recent last
+    else:
+        if len(_CONTACT_GRAPHS) >= CONTACT_GRAPH_CACHE_SIZE:
+            del _CONTACT_GRAPHS[next(iter(_CONTACT_GRAPHS))]
+        _CONTACT_GRAPHS[key] = nx.freeze(
+            _build_contact_graph(nodes, edges, membership_cols))
+    return _CONTACT_GRAPHS[key]
+
+
+def clear_graph_cache():
+    """Release the contact graphs cached by visualization(graph_cache=True)."""
+    _CONTACT_GRAPHS.clear()
+
+
+def _build_contact_graph(nodes: pd.DataFrame, edges: pd.DataFrame,
+                         membership_cols: List[str] = []) -> nx.Graph:
     """Return a graph representing the contact tracing data.
 
+    Nodes are the integer positions of the rows of [nodes], in row order, so
+    that NetworkX and the layouts hash ints rather than arbitrary labels. The
+    original labels are kept in G.graph["labels"] (node i is labels[i]).
     Edges are given an "edge_type" attribute which is "contact" for contact
     tracing data. For each membership column, edges are added between nodes
     that are members of the same group. The "edge_type" of these edges is the
     name of the membership column (E.g. membership column is "club" and nodes
     both belonging to "Club A" have an edge between them). Edges with
     "edge_type" set to "contact" have attribute "dummy" set to 0; otherwise, 1.
+    The layout "weight" of each edge is set alongside its other attributes.
 
     Args:
         nodes (pd.DataFrame): Each row is node with column for every attribute.
@@ -106,40 +207,364 @@ def _contact_graph(nodes: pd.DataFrame, edges: pd.DataFrame,
 
     Returns:
         nx.Graph: Contact tracing graph.
-    """
-    nodes = nodes.copy()
-    edges = edges.copy()
 
-    # edge attributes
-    edges["dummy"] = 0
-    edges["edge_type"] = "contact"
-    G = nx.from_pandas_edgelist(edges, edge_attr=["dummy", "edge_type"])
+    Raises:
+        KeyError: If an edge endpoint is not in the index of [nodes].
+    """
+    # nodes with their attributes, in row order
+    G = nx.Graph(labels=nodes.index)
+    G.add_nodes_from(enumerate(nodes.to_dict("records")))
 
-    # node attributes
-    G.add_nodes_from(list(nodes.index))
-    nx.set_node_attributes(G, nodes.to_dict("index"))
+    # contact edges, created with their attributes in one pass
+    source = _positions(nodes.index, edges.source).tolist()
+    target = _positions(nodes.index, edges.target).tolist()
+    G.add_edges_from(zip(source, target), dummy=0, edge_type="contact",
+                     weight=EDGE_WEIGHT_CONTACT)
 
     # add membership dummy edges
     for membership_col in membership_cols:
-        groups = nodes[membership_col].value_counts().to_dict()
-        for group, n in groups.items():
-            if group != "" and n > 1:
-                members = list(nodes[nodes[membership_col] == group].index)
-                for i in range(len(members)):
-                    for j in range(len(members)):
-                        if i < j and not G.has_edge(members[i], members[j]):
-                            G.add_edge(members[i], members[j], dummy=1,
-                                       edge_type=membership_col)
+        groups = nodes.groupby(membership_col, sort=False).indices
+        for group, index in groups.items():
+            if group != "" and len(index) > 1:
+                # pairs within a group are distinct, so they can be added
+                # lazily while G is probed for existing edges
+                members = index.tolist()
+                pairs = ((i, j) for i, j in combinations(members, 2)
+                         if not G.has_edge(i, j))
+                G.add_edges_from(pairs, dummy=1, edge_type=membership_col,
+                                 weight=EDGE_WEIGHT_DUMMY)
 
     return G
 
 
+def _edge_arrays(G: nx.Graph) -> tuple:
+    """Return the endpoints and attributes of G's edges as aligned sequences.
+
+    The edges are walked once, rather than once per nx.get_edge_attributes,
+    and per-edge renderer data is derived from these sequences without
+    touching G's attribute dicts again.
+
+    Returns:
+        tuple: Lists of edge start and end nodes, boolean array of the \
+            "dummy" attribute, and object array of the "edge_type" attribute, \
+            all in the order of G.edges.
+    """
+    start, end, dummy, edge_type = [], [], [], []
+    for u, v, data in G.edges(data=True):
+        start.append(u)
+        end.append(v)
+        dummy.append(data["dummy"])
+        edge_type.append(data["edge_type"])
+    return (start, end, np.array(dummy, dtype=bool),
+            np.array(edge_type, dtype=object))
+
+
+@_jit(parallel=True)
+def _classify_dates_kernel(date_ns, start_ns, end_ns, offset, alphas):
+    """Numba version of the loop in _classify_dates on int64 nanoseconds."""
+    n = date_ns.shape[0]
+    positive = np.zeros(n, dtype=np.bool_)
+    alpha = np.ones(n)
+    day_ns = 86400 * 10 ** 9
+    for i in prange(n):
+        d = date_ns[i]
+        if d != _NAT and d <= end_ns:
+            days = (d - start_ns) // day_ns
+            if days >= -offset:
+                positive[i] = True
+                alpha[i] = alphas[min(days + offset, alphas.shape[0] - 1)]
+    return positive, alpha
+
+
+@lru_cache(maxsize=32)
+def _alpha_table(n: int) -> np.ndarray:
+    """Return a read-only ramp of [n] alphas from 0.5 to 1 (cached by n)."""
+    alphas = np.linspace(0.5, 1, n)
+    alphas.flags.writeable = False
+    return alphas
+
+
+def _classify_dates(dates: pd.Series, start: datetime.date,
+                    end: datetime.date, offset: int) -> tuple:
+    """Return which dates are active cases and their alpha values.
+
+    A date is active if it is at most [offset] days before [start] and not
+    after [end]. Active alphas ramp linearly from 0.5 to 1 over that window;
+    every other node has alpha 1. Large cohorts use a fused Numba kernel.
+
+    Returns:
+        tuple: Boolean array of active dates and float array of alphas.
+    """
+    alphas = _alpha_table((end - start).days + offset + 1)
+    dates = pd.to_datetime(dates)
+    if njit is not None and len(dates) >= NUMBA_DATES_MIN_NODES:
+        date_ns = dates.values.astype("datetime64[ns]").view(np.int64)
+        return _classify_dates_kernel(date_ns, pd.Timestamp(start).value,
+                                      pd.Timestamp(end).value, offset,
+                                      alphas)
+    days = (dates - pd.Timestamp(start)).dt.days
+    positive = ((dates <= pd.Timestamp(end)) & (days >= -offset)).values
+    alpha_index = (days.fillna(0).values + offset).astype(int)
+    alpha = np.where(positive, np.take(alphas, alpha_index, mode="clip"), 1.)
+    return positive, alpha
+
+
+def _layout_key(G: nx.Graph, layout_args: dict) -> str:
+    """Return a hash identifying the layout of graph G with the given args.
+
+    The key depends on the node order, the weighted edges, and the layout
+    arguments (including which implementation computes the layout), which
+    together determine the seeded layout.
+    """
+    index = {n: i for i, n in enumerate(G)}
+    edges = sorted((*sorted((index[u], index[v])), w)
+                   for u, v, w in G.edges(data="weight"))
+    h = hashlib.blake2b(digest_size=16)
+    for part in (list(G), edges, sorted(layout_args.items())):
+        h.update(repr(part).encode())
+    return h.hexdigest()
+
+
+def _fr_energy(x: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+               w: np.ndarray, k: float) -> tuple:
+    """Return the Fruchterman-Reingold energy of positions x and its gradient.
+
+    Args:
+        x (np.ndarray): Flattened (n, 2) array of node positions.
+        rows (np.ndarray): First endpoint of every (undirected) edge.
+        cols (np.ndarray): Second endpoint of every edge.
+        w (np.ndarray): Attractive weight of every edge.
+        k (float): Optimal distance between nodes.
+
+    Returns:
+        tuple: The energy and its gradient with respect to x.
+    """
+    n = len(x) // 2
+    pos = x.reshape(n, 2)
+    gravity = k ** 2
+    grad = gravity * pos
+    e = gravity * (pos ** 2).sum() / 2
+
+    # attraction along edges
+    delta = pos[rows] - pos[cols]
+    d = np.sqrt((delta ** 2).sum(axis=1))
+    e += (w * d ** 3).sum() / (3 * k)
+    force = (w * d / k)[:, None] * delta
+    for axis in range(2):
+        grad[:, axis] += (np.bincount(rows, force[:, axis], n)
+                          - np.bincount(cols, force[:, axis], n))
+
+    # repulsion between all pairs of nodes, a block of rows at a time so
+    # memory stays O(n * FR_REPULSION_BLOCK) rather than O(n^2)
+    sq = (pos ** 2).sum(axis=1)
+    for lo in range(0, n, FR_REPULSION_BLOCK):
+        hi = min(lo + FR_REPULSION_BLOCK, n)
+        block = pos[lo:hi]
+        diag = (np.arange(hi - lo), np.arange(lo, hi))
+        d2 = np.maximum(sq[lo:hi, None] + sq[None, :]
+                        - 2 * block @ pos.T, 1e-9)
+        d2[diag] = 1
+        e -= k ** 2 * np.log(d2).sum() / 4
+        inv = 1 / d2
+        inv[diag] = 0
+        grad[lo:hi] -= k ** 2 * (block * inv.sum(axis=1)[:, None]
+                                 - inv @ pos)
+
+    return e, grad.ravel()
+
+
+def _fr_lbfgs_layout(G: nx.Graph, k: float = None, weight: str = "weight",
+                     seed: int = None, iterations: int = 150) -> dict:
+    """Return Fruchterman-Reingold positions found by L-BFGS minimization.
+
+    Rather than simulating the Fruchterman-Reingold forces with a fixed step
+    size, minimize the corresponding energy with SciPy's L-BFGS-B. The
+    attractive term d^3 / 3k is summed over the (sparse) weighted edges and
+    the repulsive term -k^2 ln(d) over all pairs of nodes. A weak pull towards
+    the origin keeps disconnected components from drifting apart; see
+    _fr_energy.
+
+    Args:
+        G (nx.Graph): Graph to lay out.
+        k (float): Optimal distance between nodes (1/sqrt(n) if None).
+        weight (str): Edge attribute used as the attractive weight.
+        seed (int): Seed for the random initial positions.
+        iterations (int): Maximum number of L-BFGS iterations.
+
+    Returns:
+        dict: Dictionary mapping each node to its (x, y) position.
+    """
+    n = len(G)
+    if n == 0:
+        return {}
+    if k is None:
+        k = 1 / np.sqrt(n)
+
+    A = sp.triu(nx.to_scipy_sparse_array(G, weight=weight), k=1).tocoo()
+    x0 = np.random.RandomState(seed).rand(2 * n)
+    result = minimize(_fr_energy, x0, args=(A.row, A.col, A.data, k),
+                      jac=True, method="L-BFGS-B",
+                      options={"maxiter": iterations})
+    pos = nx.rescale_layout(result.x.reshape(n, 2))
+    return dict(zip(G, pos))
+
+
+@_jit(parallel=True, fastmath=True)
+def _fr_displacement(pos, indptr, indices, weights, k):
+    """Return the Fruchterman-Reingold displacement of every node.
+
+    Each node sums the repulsion from all other nodes and the attraction along
+    its own row of the CSR adjacency, so rows can be computed in parallel.
+    """
+    n = pos.shape[0]
+    disp = np.zeros_like(pos)
+    for i in prange(n):
+        xi, yi = pos[i, 0], pos[i, 1]
+        dx_sum, dy_sum = 0.0, 0.0
+        for j in range(n):
+            if j != i:
+                dx, dy = xi - pos[j, 0], yi - pos[j, 1]
+                f = k * k / max(dx * dx + dy * dy, 1e-4)
+                dx_sum += dx * f
+                dy_sum += dy * f
+        for p in range(indptr[i], indptr[i + 1]):
+            j = indices[p]
+            dx, dy = xi - pos[j, 0], yi - pos[j, 1]
+            f = weights[p] * max(np.sqrt(dx * dx + dy * dy), 0.01) / k
+            dx_sum -= dx * f
+            dy_sum -= dy * f
+        disp[i, 0], disp[i, 1] = dx_sum, dy_sum
+    return disp
+
+
+@_jit(fastmath=True)
+def _fr_steps(pos, indptr, indices, weights, k, iterations, threshold):
+    """Run the cooled Fruchterman-Reingold iterations on pos in place."""
+    n = pos.shape[0]
+    t = max(pos[:, 0].max() - pos[:, 0].min(),
+            pos[:, 1].max() - pos[:, 1].min()) * 0.1
+    dt = t / (iterations + 1)
+    for _ in range(iterations):
+        disp = _fr_displacement(pos, indptr, indices, weights, k)
+        moved = 0.0
+        for i in range(n):
+            length = max(np.sqrt(disp[i, 0] ** 2 + disp[i, 1] ** 2), 0.01)
+            dx, dy = disp[i, 0] * t / length, disp[i, 1] * t / length
+            pos[i, 0] += dx
+            pos[i, 1] += dy
+            moved += dx * dx + dy * dy
+        t -= dt
+        if np.sqrt(moved) / n < threshold:
+            break
+    return pos
+
+
+def _fr_numba_layout(G: nx.Graph, k: float = None, weight: str = "weight",
+                     seed: int = None, iterations: int = 50) -> dict:
+    """Return Fruchterman-Reingold positions computed by a Numba kernel.
+
+    Follows the same force model, cooling schedule, and seeded initial
+    positions as nx.spring_layout, but computes the forces in a compiled,
+    parallel loop over the nodes instead of with dense NumPy arrays.
+
+    Args:
+        G (nx.Graph): Graph to lay out.
+        k (float): Optimal distance between nodes (1/sqrt(n) if None).
+        weight (str): Edge attribute used as the attractive weight.
+        seed (int): Seed for the random initial positions.
+        iterations (int): Maximum number of iterations.
+
+    Returns:
+        dict: Dictionary mapping each node to its (x, y) position.
+    """
+    n = len(G)
+    if n == 0:
+        return {}
+    if k is None:
+        k = 1 / np.sqrt(n)
+    A = nx.to_scipy_sparse_array(G, weight=weight, format="csr")
+    pos = np.random.RandomState(seed).rand(n, 2)
+    _fr_steps(pos, A.indptr, A.indices, A.data.astype(float), k, iterations,
+              1e-4)
+    return dict(zip(G, nx.rescale_layout(pos)))
+
+
+def _numba_spring(G: nx.Graph) -> bool:
+    """Return whether _spring_layout lays out G with the Numba kernel."""
+    return njit is not None and len(G) > NUMBA_LAYOUT_MIN_NODES
+
+
+def _spring_layout(G: nx.Graph, **layout_args) -> dict:
+    """Return nx.spring_layout positions, using Numba for large graphs."""
+    if _numba_spring(G):
+        return _fr_numba_layout(G, **layout_args)
+    return nx.spring_layout(G, **layout_args)
+
+
+LAYOUTS = {"spring": _spring_layout, "fr_lbfgs": _fr_lbfgs_layout}
+
+
+def _layout(G: nx.Graph, layout: str = "spring",
+            cache_dir: str = None) -> dict:
+    """Return node positions for graph G using the given layout algorithm.
+
+    If a cache directory is given, positions are saved there keyed by a hash
+    of the graph and reused on subsequent calls with the same graph. Cache
+    files are written atomically, and an unreadable one is recomputed.
+
+    Args:
+        G (nx.Graph): Contact tracing graph with edge attribute "weight".
+        layout (str): Name of the layout algorithm (a key of LAYOUTS).
+        cache_dir (str): Directory to cache layouts in (no caching if None).
+
+    Returns:
+        dict: Dictionary mapping each node to its (x, y) position.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'. "
+                         f"Expected one of {list(LAYOUTS)}.")
+    layout_fn = LAYOUTS[layout]
+    layout_args = {"k": 0.13, "weight": "weight", "seed": 1,
+                   "iterations": 150}
+    if cache_dir is None:
+        return layout_fn(G, **layout_args)
+
+    # "spring" runs NetworkX or the Numba kernel depending on the graph size
+    # and whether numba is installed; their positions differ
+    key_args = {"layout": layout, **layout_args}
+    if layout == "spring":
+        key_args["impl"] = "numba" if _numba_spring(G) else "networkx"
+    key = _layout_key(G, key_args)
+    path = os.path.join(cache_dir, f"pos_{key}.npz")
+    if os.path.exists(path):
+        try:
+            with np.load(path) as cached:
+                return dict(zip(G, cached["xy"]))
+        except (OSError, EOFError, ValueError, KeyError,
+                zipfile.BadZipFile):
+            pass  # e.g. truncated by an interrupted run; recompute it
+
+    pos = layout_fn(G, **layout_args)
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary file first so that [path] is never left partial
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, xy=np.array([pos[n] for n in G]))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return pos
+
+
 def _blank_plot(name, height, width):
     """Create a blank plot with default configurations set."""
     plot = figure(title=name,
                   width=width,
                   height=height,
-                  tools="pan, wheel_zoom, box_zoom, reset")
+                  tools="pan, wheel_zoom, box_zoom, reset",
+                  output_backend="webgl")
     plot.toolbar.logo = None
     plot.xgrid.grid_line_color = None
     plot.ygrid.grid_line_color = None
@@ -151,72 +576,121 @@ def _blank_plot(name, height, width):
     return plot
 
 
-def _graph_renderer(G):
-    """Return a graph renderer for graph G."""
-    graph_renderer = from_networkx(G, nx.get_node_attributes(G, "pos"))
+def _graph_renderer(node_source, edge_source, layout_provider):
+    """Return a graph renderer drawing the given node and edge sources."""
+    graph_renderer = GraphRenderer(layout_provider=layout_provider)
+    graph_renderer.node_renderer.data_source = node_source
+    graph_renderer.edge_renderer.data_source = edge_source
+    # node color is sent as 0 (negative) / 1 (positive) and edge dash as
+    # 0 (contact) / 1 (dummy); both index a two-entry palette in the browser
+    color = CustomJSTransform(args={"palette": [NEGATIVE_COLOR,
+                                                POSITIVE_COLOR]},
+                              v_func=_resource("palette.js"))
+    dash = CustomJSTransform(args={"palette": [EDGE_DASH_CONTACT,
+                                               EDGE_DASH_DUMMY]},
+                             v_func=_resource("palette.js"))
     graph_renderer.node_renderer.glyph = Circle(radius="size",
                                                 radius_units="screen",
-                                                fill_color="color",
+                                                fill_color=transform("color",
+                                                                     color),
                                                 fill_alpha="alpha",
                                                 line_alpha="alpha")
     graph_renderer.edge_renderer.glyph = MultiLine(line_width=EDGE_LINE_WIDTH,
                                                    line_alpha="alpha",
-                                                   line_dash="dash")
+                                                   line_dash=transform("dash",
+                                                                       dash))
     return graph_renderer
 
 
-def _case_labels(G):
-    """Return LabelSet object with case number labels for given nodes."""
-    case_dict = nx.get_node_attributes(G, "case")
-    case_dict = {k:v for k,v in case_dict.items() if not pd.isnull(v)}
-    ids, case = zip(*case_dict.items())
-    pos_dict = nx.get_node_attributes(G, "pos")
-    pos = [pos_dict[id] for id in ids]
-    x, y = list(zip(*pos))
-    case_labels = ColumnDataSource(data={"x": x, "y": y, "case": case})
+def _case_labels(case, xy):
+    """Return LabelSet object with case number labels for given nodes.
+
+    Args:
+        case (np.ndarray): Case number of every node (missing if not a case).
+        xy (np.ndarray): (N, 2) array of node positions in the same order.
+    """
+    has_case = pd.notna(case)
+    x, y = xy[has_case].T
+    case_labels = ColumnDataSource(data={"x": x, "y": y,
+                                         "case": case[has_case]})
     return LabelSet(x="x", y="y", text="case",
                     x_offset=LABEL_OFFSET, y_offset=LABEL_OFFSET,
                     text_font_size=LABEL_TEXT_SIZE,
                     source=case_labels)
 
 
-def _hover_labels(G, graph_renderer, attributes):
+def _hover_column(values: pd.Series) -> list:
+    """Return the values of a node attribute as shown by the hover labels.
+
+    Datetime columns become ISO date strings (Bokeh would otherwise send
+    epoch milliseconds), and missing values (NaN, NaT) become None so that
+    they are sent as null.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        values = values.dt.strftime("%Y-%m-%d")
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def _hover_labels(graph_renderer, attributes):
     """Add hover labels to plot."""
     tooltips = [(attr, f"@{attr}") for attr in attributes]
     return HoverTool(tooltips=tooltips,
                      renderers=[graph_renderer.node_renderer])
 
 
-def _tab(title, tab_name, G, attributes):
-    """Return a tab (Panel) showing graph G of nodes"""
+def _graph_plot(title, xy, graph_renderer, attributes):
+    """Return the graph plot with its search bar and instructions.
+
+    The case labels and the search bar both read the case numbers from the
+    renderer's node source, which is aligned with the rows of [xy].
+    """
+    node_source = graph_renderer.node_renderer.data_source
+    case = np.array(node_source.data["case"], dtype=object)
+
     p = _blank_plot(title, GRAPH_PLOT_HEIGHT, GRAPH_PLOT_WIDTH)
-    graph_renderer = _graph_renderer(G)
     p.renderers.append(graph_renderer)
-    p.add_layout(_case_labels(G))
-    p.tools.append(_hover_labels(G, graph_renderer, attributes))
+    p.add_layout(_case_labels(case, xy))
+    p.tools.append(_hover_labels(graph_renderer, attributes))
 
     # add custom JS to button and search bar
-    node_source = graph_renderer.node_renderer.data_source
     button = Button(label="Reset", button_type="default")
-    button.js_on_click(CustomJS(args={"source": node_source}, code=BUTTON_JS))
+    button.js_on_click(CustomJS(args={"source": node_source},
+                                code=_resource("button.js")))
+    # map each case number to the first node with it for O(1) search lookups
+    case_index = {}
+    for i in np.flatnonzero(pd.notna(case)).tolist():
+        case_index.setdefault(case[i], i)
     text_input = TextInput(value="case_number", title="Search Case:")
-    text_input.js_on_change("value", CustomJS(args={"source": node_source},
-                                              code=SEARCH_JS))
+    text_input.js_on_change("value", CustomJS(
+        args={"source": node_source, "case_index": case_index},
+        code=_resource("search.js")))
 
     # aggregate plot
     plot = gridplot([[p],
                      [row(text_input, button, sizing_mode="stretch_both")],
-                     [Div(text=INSTRUCTIONS_HTML,
+                     [Div(text=_resource("instructions.html"),
                           styles={"overflow-wrap": "break-word",
                                   "width": f"{INSTRUCTIONS_PLOT_WIDTH}px"})]],
                     toolbar_options={'logo': None})
 
-    return TabPanel(child=plot, title=tab_name)
+    return plot
+
+
+def _tabs(tab_names, edge_source):
+    """Return tabs which show column "alpha_{i}" of edge_source for tab i."""
+    tabs = Tabs(sizing_mode="stretch_width",
+                tabs=[TabPanel(child=Spacer(height=0), title=tab_name)
+                      for tab_name in tab_names])
+    tabs.js_on_change("active", CustomJS(args={"source": edge_source},
+                                         code=_resource("tabs.js")))
+    return tabs
 
 
 def visualization(title: str, file_name: str, nodes: pd.DataFrame,
                   edges: pd.DataFrame, start: datetime.date,
-                  end: datetime.date, membership_cols: List[str] = []):
+                  end: datetime.date, membership_cols: List[str] = [],
+                  layout: str = "spring", layout_cache: str = None,
+                  graph_cache: bool = False):
     """Write an HTML visualization of the given contact tracing graph.
 
     The visualization has the following tabs:
@@ -224,6 +698,8 @@ def visualization(title: str, file_name: str, nodes: pd.DataFrame,
     (2) Contact Traces: only contact edges are shown
     (3) Membership: only membership edges are shown
     Furthermore, there is a membership tab for every membership column passed.
+    The tab of a membership column is left out if it would show no edges (e.g.
+    if every group in the column has a single member).
 
     Args:
         title (str): Title of the visualization.
@@ -236,47 +712,40 @@ def visualization(title: str, file_name: str, nodes: pd.DataFrame,
         end (datetime.date): End date (show cases after this data as inactive \
             (blue) on the visualization).
         membership_cols (List[str]): List of columns recognized as memberships.
+        layout (str): Graph layout algorithm: "spring" (NetworkX spring \
+            layout) or "fr_lbfgs" (L-BFGS minimized Fruchterman-Reingold, \
+            faster for graphs with more than a few hundred nodes).
+        layout_cache (str): Directory in which to cache the graph layout \
+            between runs (the layout is recomputed every run if None).
+        graph_cache (bool): Keep the contact graph in memory and reuse it in \
+            later calls with equal data (see clear_graph_cache).
+
+    Returns:
+        column: The Bokeh layout written to [file_name].
     """
     attributes = nodes.columns
 
     # prune and initialize contact graph
     nodes, edges = _prune(nodes, edges, start, end)
-    G = _contact_graph(nodes, edges, membership_cols)
-
-    # set node color of positive cases
-    nx.set_node_attributes(G, values=NODE_SIZE_DEFAULT, name='size')
-
-    offset = 14  # days (2 weeks)
-    alphas = list(np.linspace(0.5, 1, (end - start).days + offset + 1))
-    node_alpha = {}
-    node_color = {}
-    for id, date in nx.get_node_attributes(G, "date").items():
-        # blue if tested positive before 2 weeks of [start] or after [end]
-        if pd.isnull(date) or date > end or (start - date).days > offset:
-            node_alpha[id] = 1
-            node_color[id] = NEGATIVE_COLOR
-        # red if tested positive within 2 weeks of [start] and before [end]
-        else:
-            node_alpha[id] = alphas[(date - start).days + offset]
-            node_color[id] = POSITIVE_COLOR
-    nx.set_node_attributes(G, values=node_alpha, name='alpha')
-    nx.set_node_attributes(G, values=node_color, name='color')
-
-    # set edge properties of dummy vs. actual edges
-    dummy_attribute = nx.get_edge_attributes(G, "dummy").items()
-
-    edge_attributes = [
-        (EDGE_ALPHA_CONTACT, EDGE_ALPHA_DUMMY, "alpha"),
-        (EDGE_DASH_CONTACT, EDGE_DASH_DUMMY, "dash"),
-        (EDGE_WEIGHT_CONTACT, EDGE_WEIGHT_DUMMY, "weight")
-    ]
+    G = _contact_graph(nodes, edges, membership_cols, graph_cache)
+
+    # node color of positive cases
+    # red if tested positive within 2 weeks of [start] and before [end]
+    # blue otherwise (never tested positive, or outside of that window)
+    # styles are kept in arrays (G order is row order) since G is shared
+    # with the cache
+    positive, node_alpha = _classify_dates(nodes.date, start, end, offset=14)
+
+    # edge properties of dummy vs. actual edges
+    edge_start, edge_end, is_dummy, edge_type = _edge_arrays(G)
 
-    for contact, dummy, name in edge_attributes:
-        alpha = {k:{0:contact, 1:dummy}[v] for k,v in dummy_attribute}
-        nx.set_edge_attributes(G, values=alpha, name=name)
+    def edge_values(contact, dummy):
+        """Return array giving contact edges [contact] and others [dummy]."""
+        return np.where(is_dummy, dummy, contact)
 
-    pos = nx.spring_layout(G, k=0.13, weight="weight", seed=1, iterations=150)
-    nx.set_node_attributes(G, pos, "pos")
+    # one (N, 2) array of positions in node order shared by every consumer
+    pos = _layout(G, layout, layout_cache)
+    xy = np.array([pos[n] for n in G], dtype=float)
 
     # Add date range to title
     date_format = r'%-m/%-d/%Y'
@@ -284,34 +753,50 @@ def visualization(title: str, file_name: str, nodes: pd.DataFrame,
     end_str = end.strftime(date_format)
     title = f"{title} [{start_str} - {end_str}]"
 
-    # all edges
-    edge_alpha = {k:{0:EDGE_ALPHA_CONTACT, 1:EDGE_ALPHA_DUMMY}[v]
-                  for k,v in dummy_attribute}
-    nx.set_edge_attributes(G, values=edge_alpha, name="alpha")
-    tab1 = _tab(title, "All", G, attributes)
-
-    # only contact edges
-    edge_alpha = {k:{0:EDGE_ALPHA_CONTACT, 1:0}[v] for k,v in dummy_attribute}
-    nx.set_edge_attributes(G, values=edge_alpha, name="alpha")
-    tab2 = _tab(title, "Contact Traces", G, attributes)
-
-    # only group edges
-    edge_alpha = {k:{0:0, 1:EDGE_ALPHA_DUMMY}[v] for k,v in dummy_attribute}
-    nx.set_edge_attributes(G, values=edge_alpha, name='alpha')
-    tab3 = _tab(title, "Membership", G, attributes)
-
-    tabs = [tab1, tab2, tab3]
+    # a single plot is shared by every tab; only edge alpha differs
+    # plain [x, y] lists serialize far smaller than one ndarray per node
+    layout_provider = StaticLayoutProvider(
+        graph_layout=dict(zip(G, xy.tolist())))
+    # only ship the columns used by the glyphs, hover tool, and search bar;
+    # nodes are identified by their integer row position in the browser too
+    # the computed styles come last so they win over same-named attributes
+    node_source = ColumnDataSource(data={
+        **{attr: _hover_column(nodes[attr]) for attr in attributes},
+        "index": list(G),
+        "size": np.full(len(G), NODE_SIZE_DEFAULT, dtype=np.int16),
+        "color": positive.astype(np.uint8),
+        "alpha": node_alpha.astype(np.float32)})
+    edge_data = {"start": edge_start, "end": edge_end,
+                 "dash": is_dummy.astype(np.uint8)}
+
+    tab_names = ["All", "Contact Traces", "Membership"]
+    edge_alphas = [
+        # all edges
+        edge_values(EDGE_ALPHA_CONTACT, EDGE_ALPHA_DUMMY),
+        # only contact edges
+        edge_values(EDGE_ALPHA_CONTACT, 0),
+        # only group edges
+        edge_values(0, EDGE_ALPHA_DUMMY)
+    ]
 
-    # tab for every membership column
+    # tab for every membership column with at least one membership edge
     for membership in membership_cols:
-        edge_alpha = {k:(EDGE_ALPHA_DUMMY if v == membership else 0)
-                      for k,v in nx.get_edge_attributes(G,'edge_type').items()}
-        nx.set_edge_attributes(G, values=edge_alpha, name='alpha')
-
-        tabs.append(_tab(title, membership, G, attributes))
-
-    plot = Tabs(tabs=tabs)
+        if not (edge_type == membership).any():
+            continue
+        tab_names.append(membership)
+        edge_alphas.append(
+            np.where(edge_type == membership, EDGE_ALPHA_DUMMY, 0))
+
+    # every tab's alphas live on the edge source; "alpha" is the shown one
+    edge_alphas = {f"alpha_{i}": np.asarray(alpha, dtype=np.float32)
+                   for i, alpha in enumerate(edge_alphas)}
+    edge_source = ColumnDataSource(data={**edge_data, **edge_alphas,
+                                         "alpha": edge_alphas["alpha_0"]})
+    graph_renderer = _graph_renderer(node_source, edge_source, layout_provider)
+    plot = column(_tabs(tab_names, edge_source),
+                  _graph_plot(title, xy, graph_renderer, attributes))
 
     # export
     output_file(file_name, title=title)
     save(plot)
+    return plot
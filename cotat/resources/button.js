@@ -1,8 +1,4 @@
-var case_numbers = source.data["case"]
-
-for (let i = 0; i < source.data["alpha"].length; i++) {{
-    source.data["alpha"][i] = {NODE_ALPHA_DEFAULT}
-    source.data["size"][i] = {NODE_SIZE_DEFAULT}
-}}
+source.data["alpha"].fill({NODE_ALPHA_DEFAULT})
+source.data["size"].fill({NODE_SIZE_DEFAULT})
 
 source.change.emit()
@@ -0,0 +1 @@
+return Array.from(xs, (x) => palette[x])
@@ -0,0 +1,2 @@
+source.data["alpha"] = source.data["alpha_" + this.active]
+source.change.emit()
@@ -1,19 +1,266 @@
 import os
+import pytest
+import networkx as nx
 import pandas as pd
 import numpy as np
 from datetime import date
-from cotat.cotat import visualization
+from bokeh.models import GraphRenderer, Tabs
+import cotat.cotat
+from scipy.optimize import check_grad
+from cotat.cotat import (visualization, _prune, _contact_graph,
+                         _classify_dates, _fr_energy, _fr_lbfgs_layout,
+                         _fr_numba_layout, _layout)
 
 RESOURCES_PATH = os.path.join(os.path.dirname(__file__), 'resources')
+MEMBERSHIP_COLS = ["group_1", "group_2", "group_3"]
 
 
-def test_cotat():
-    nodes = pd.read_csv(os.path.join(RESOURCES_PATH, 'nodes.csv'), index_col=0)
-    nodes = nodes.replace({np.nan: None})
-    nodes['date'] = pd.to_datetime(nodes['date']).apply(lambda x: x.date())
-    nodes = nodes.replace({pd.NaT: None})
+def _read_data():
+    # blank cells are missing cases and dates, but "" for the other columns
+    nodes = pd.read_csv(os.path.join(RESOURCES_PATH, 'nodes.csv'), index_col=0,
+                        keep_default_na=False,
+                        na_values={"case": [""], "date": [""]},
+                        dtype={col: str for col in MEMBERSHIP_COLS},
+                        parse_dates=["date"])
     edges = pd.read_csv(os.path.join(RESOURCES_PATH, 'edges.csv'), index_col=0)
+    return nodes, edges
+
+
+def test_cotat():
+    nodes, edges = _read_data()
     start = date(2021, 12, 1)
     end = date(2021, 12, 5)
     visualization("Contact Tracing Visualization", "test.html", nodes, edges,
-                  start, end, ["group_1", "group_2", "group_3"])
+                  start, end, MEMBERSHIP_COLS)
+
+
+def test_cotat_layout_cache(tmp_path, monkeypatch):
+    nodes, edges = _read_data()
+    start = date(2021, 12, 1)
+    end = date(2021, 12, 5)
+    cache_dir = str(tmp_path / "cache")
+    calls = []
+    spring = cotat.cotat.LAYOUTS["spring"]
+
+    def counting_spring(G, **layout_args):
+        calls.append(len(G))
+        return spring(G, **layout_args)
+
+    monkeypatch.setitem(cotat.cotat.LAYOUTS, "spring", counting_spring)
+
+    def positions(layout_cache):
+        plot = visualization("Contact Tracing Visualization",
+                             str(tmp_path / "test.html"), nodes, edges,
+                             start, end, MEMBERSHIP_COLS,
+                             layout_cache=layout_cache)
+        renderer = plot.select_one({"type": GraphRenderer})
+        return renderer.layout_provider.graph_layout
+
+    uncached = positions(None)
+    assert len(calls) == 1
+    for _ in range(2):
+        assert positions(cache_dir) == uncached
+    assert len(calls) == 2
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_layout_cache_recovers_from_truncated_file(tmp_path):
+    G = nx.gnm_random_graph(20, 40, seed=0)
+    nx.set_edge_attributes(G, 1, "weight")
+    cache_dir = str(tmp_path / "cache")
+    pos = _layout(G, "spring", cache_dir)
+    (path,) = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir)]
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+    cached = _layout(G, "spring", cache_dir)
+    assert all(np.array_equal(cached[n], pos[n]) for n in G)
+    assert os.listdir(cache_dir) == [os.path.basename(path)]
+    open(path, "wb").close()
+    cached = _layout(G, "spring", cache_dir)
+    assert all(np.array_equal(cached[n], pos[n]) for n in G)
+
+
+def test_layout_cache_key_records_implementation(tmp_path, monkeypatch):
+    G = nx.gnm_random_graph(20, 40, seed=0)
+    nx.set_edge_attributes(G, 1, "weight")
+    cache_dir = str(tmp_path / "cache")
+    monkeypatch.setattr(cotat.cotat, "njit", None)
+    _layout(G, "spring", cache_dir)
+    monkeypatch.setattr(cotat.cotat, "njit", lambda **options: None)
+    monkeypatch.setattr(cotat.cotat, "NUMBA_LAYOUT_MIN_NODES", 0)
+    monkeypatch.setitem(cotat.cotat.LAYOUTS, "spring",
+                        lambda G, **layout_args: dict.fromkeys(G, (0, 0)))
+    assert set(_layout(G, "spring", cache_dir).values()) == {(0, 0)}
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_cotat_fr_lbfgs_layout(tmp_path):
+    nodes, edges = _read_data()
+    start = date(2021, 12, 1)
+    end = date(2021, 12, 5)
+    visualization("Contact Tracing Visualization",
+                  str(tmp_path / "test.html"), nodes, edges, start, end,
+                  MEMBERSHIP_COLS, layout="fr_lbfgs")
+
+
+@pytest.mark.parametrize("block", [3, 1024])
+def test_fr_energy_gradient(monkeypatch, block):
+    monkeypatch.setattr(cotat.cotat, "FR_REPULSION_BLOCK", block)
+    G = nx.gnm_random_graph(8, 12, seed=0)
+    rows, cols = np.array(G.edges).T
+    w = np.random.RandomState(0).rand(len(rows)) + 0.05
+    x = np.random.RandomState(1).rand(2 * len(G))
+    error = check_grad(lambda x: _fr_energy(x, rows, cols, w, 0.3)[0],
+                       lambda x: _fr_energy(x, rows, cols, w, 0.3)[1], x)
+    assert error < 1e-5
+
+
+def test_fr_lbfgs_layout():
+    G = nx.disjoint_union(nx.path_graph(10), nx.cycle_graph(12))
+    nx.set_edge_attributes(G, 1, "weight")
+    pos = _fr_lbfgs_layout(G, k=0.13, seed=1, iterations=150)
+    assert set(pos) == set(G)
+    xy = np.array([pos[n] for n in G])
+    assert np.isfinite(xy).all()
+    assert len(np.unique(xy.round(6), axis=0)) == len(G)
+
+
+@pytest.mark.parametrize("iterations", [1, 3, 10])
+def test_fr_numba_layout_matches_networkx(iterations):
+    pytest.importorskip("numba")
+    G = nx.gnm_random_graph(200, 400, seed=0)
+    nx.set_edge_attributes(G, 1, "weight")
+    pos = _fr_numba_layout(G, k=0.13, seed=1, iterations=iterations)
+    expected = nx.spring_layout(G, k=0.13, seed=1, iterations=iterations)
+    assert np.allclose([pos[n] for n in G], [expected[n] for n in G])
+
+
+def test_contact_graph_membership_edges():
+    nodes = pd.DataFrame({"club": ["A", "A", "A", "B", "", ""],
+                          "case": [1, 2, 3, 4, 5, 6]},
+                         index=[10, 11, 12, 13, 14, 15])
+    edges = pd.DataFrame({"source": [10], "target": [13]})
+    G = _contact_graph(nodes, edges, ["club"])
+    labels = G.graph["labels"]
+    assert list(G) == list(range(len(nodes))) and labels.equals(nodes.index)
+    edge_types = {tuple(sorted((labels[u], labels[v]))): edge_type
+                  for u, v, edge_type in G.edges(data="edge_type")}
+    assert edge_types == {(10, 13): "contact", (10, 11): "club",
+                          (10, 12): "club", (11, 12): "club"}
+
+
+def test_classify_dates_numba_matches_numpy(monkeypatch):
+    pytest.importorskip("numba")
+    days = np.random.RandomState(0).randint(-40, 40, 6000)
+    dates = pd.Series(pd.Timestamp(2021, 12, 1) + pd.to_timedelta(days, "D"))
+    dates[::7] = pd.NaT
+    start, end = date(2021, 12, 1), date(2021, 12, 5)
+    positive, alpha = _classify_dates(dates, start, end, 14)
+    monkeypatch.setattr(cotat.cotat, "NUMBA_DATES_MIN_NODES", len(dates) + 1)
+    expected_positive, expected_alpha = _classify_dates(dates, start, end, 14)
+    assert (positive == expected_positive).all()
+    assert np.allclose(alpha, expected_alpha)
+
+
+@pytest.mark.parametrize("numba", [False, True])
+def test_classify_dates_boundaries(monkeypatch, numba):
+    if numba:
+        pytest.importorskip("numba")
+        monkeypatch.setattr(cotat.cotat, "NUMBA_DATES_MIN_NODES", 0)
+    dates = pd.Series(pd.to_datetime([
+        None, "2021-11-17", "2021-11-16", "2021-11-16 12:00", "2021-12-05",
+        "2021-12-05 12:00", "2021-12-06", "1960-01-01"], format="ISO8601"))
+    start, end = date(2021, 12, 1), date(2021, 12, 5)
+    positive, alpha = _classify_dates(dates, start, end, 14)
+    assert positive.tolist() == [False, True, False, False, True,
+                                 False, False, False]
+    assert np.allclose(alpha, [1, 0.5, 1, 1, 1, 1, 1, 1])
+
+
+def test_classify_dates_accepts_datetime64():
+    nodes, _ = _read_data()
+    start, end = date(2021, 12, 1), date(2021, 12, 5)
+    dates = nodes.date
+    assert dates.dtype.kind == "M"
+    positive_64, alpha_64 = _classify_dates(dates, start, end, 14)
+    dates = dates.apply(lambda x: None if pd.isnull(x) else x.date())
+    positive, alpha = _classify_dates(dates, start, end, 14)
+    assert positive.any() and (positive == positive_64).all()
+    assert np.allclose(alpha, alpha_64)
+
+
+def test_contact_graph_cache():
+    nodes, edges = _read_data()
+    assert (_contact_graph(nodes, edges, MEMBERSHIP_COLS)
+            is not _contact_graph(nodes, edges, MEMBERSHIP_COLS))
+    G = _contact_graph(nodes, edges, MEMBERSHIP_COLS, cache=True)
+    assert (_contact_graph(nodes.copy(), edges.copy(), MEMBERSHIP_COLS,
+                           cache=True) is G)
+    assert _contact_graph(nodes, edges, MEMBERSHIP_COLS[:1],
+                          cache=True) is not G
+    with pytest.raises(nx.NetworkXError):
+        G.add_node("new")
+    cotat.cotat.clear_graph_cache()
+    assert _contact_graph(nodes, edges, MEMBERSHIP_COLS, cache=True) is not G
+    cotat.cotat.clear_graph_cache()
+
+
+def test_cotat_skips_empty_membership_tabs(tmp_path):
+    nodes = pd.DataFrame({"case": [1, None, 2, None],
+                          "date": [date(2021, 12, 1), None] * 2,
+                          "club": ["A", "A", "B", ""],
+                          "dorm": ["X", "Y", "Z", ""],
+                          "team": ["T", "", "T", ""]})
+    edges = pd.DataFrame({"source": [0, 2], "target": [1, 3]})
+    plot = visualization("Contact Tracing Visualization",
+                         str(tmp_path / "test.html"), nodes, edges,
+                         date(2021, 12, 1), date(2021, 12, 5),
+                         ["club", "dorm", "team"])
+    tabs = plot.select_one({"type": Tabs})
+    assert [tab.title for tab in tabs.tabs] == ["All", "Contact Traces",
+                                                "Membership", "team"]
+
+
+def test_prune_unknown_edge_endpoint():
+    nodes = pd.DataFrame({"date": [date(2021, 12, 1)] * 3},
+                         index=[10, 11, 12])
+    edges = pd.DataFrame({"source": [10], "target": [99]})
+    with pytest.raises(KeyError, match="99"):
+        _prune(nodes, edges, date(2021, 12, 1), date(2021, 12, 5))
+
+
+def test_contact_graph_unknown_edge_endpoints():
+    nodes = pd.DataFrame({"case": [1, 2, 3]}, index=[10, 11, 12])
+    edges = pd.DataFrame({"source": [10, 11], "target": [98, 99]})
+    with pytest.raises(KeyError, match=r"\[98, 99\]"):
+        _contact_graph(nodes, edges)
+
+
+def test_cotat_styles_win_over_node_attributes(tmp_path):
+    nodes, edges = _read_data()
+    nodes = nodes.assign(color="green", size=100, alpha="high")
+    plot = visualization("Contact Tracing Visualization",
+                         str(tmp_path / "test.html"), nodes, edges,
+                         date(2021, 12, 1), date(2021, 12, 5),
+                         MEMBERSHIP_COLS)
+    renderer = plot.select_one({"type": GraphRenderer})
+    data = renderer.node_renderer.data_source.data
+    assert set(data["color"]) <= {0, 1}
+    assert (data["size"] == cotat.cotat.NODE_SIZE_DEFAULT).all()
+    assert data["alpha"].dtype == np.float32
+
+
+def test_cotat_hover_dates_and_missing_values(tmp_path):
+    nodes, edges = _read_data()
+    assert nodes.date.dtype.kind == "M"
+    plot = visualization("Contact Tracing Visualization",
+                         str(tmp_path / "test.html"), nodes, edges,
+                         date(2021, 12, 1), date(2021, 12, 5),
+                         MEMBERSHIP_COLS)
+    renderer = plot.select_one({"type": GraphRenderer})
+    data = renderer.node_renderer.data_source.data
+    dates = [d for d in data["date"] if d is not None]
+    assert dates and all(isinstance(d, str) for d in dates)
+    assert "2021-12-02" in dates
+    assert None in data["date"] and None in data["case"]
+    assert not any(isinstance(c, float) and np.isnan(c) for c in data["case"])
@@ -28,6 +28,7 @@ setup(
         "numpy>=1.20",
         "pandas>=1.2",
         "networkx>=2.5",
+        "scipy>=1.6",
         "bokeh>=3.4"
     ],
     extras_require={
@@ -35,7 +36,8 @@ setup(
                 'mock>=3',
                 'coverage>=4.5',
                 'tox>=3',
-                "flake8>=3.9"]
+                "flake8>=3.9"],
+        "numba": ["numba>=0.53"]
     },
     python_requires='>=3.5',
 )